@@ -9,10 +9,16 @@ import numpy as np
 
 from typing import Tuple, Type, Optional
 
+try:
+    from yaml import CSafeLoader as SafeLoader          # libyaml bindings, much faster if available
+except ImportError:
+    from yaml import SafeLoader
+
 from astropy import units as u
 from astropy.coordinates import EarthLocation
 
 from PyQt6 import QtWidgets
+from PyQt6.QtCore import QTimer, QSignalBlocker
 from PyQt6.QtWidgets import QApplication, QMainWindow
 
 import matplotlib as mpl
@@ -30,8 +36,47 @@ from amos import AMOS, Station
 mpl.use('Qt5Agg')
 
 COUNT = 100
+RASTERIZE_THRESHOLD = 500                   # scatters with more points than this are drawn as a single image
+DEBOUNCE_INTERVAL = 30                      # ms, bursts of valueChanged signals within this interval cause only one update
+
+
+
+
+class Blitter():
+    """
+    Redraws only the animated artists of a canvas over a cached background.
+    The background is captured on every full draw, so a resize or a change of limits just needs canvas.draw_idle().
+    Animated artists are skipped by Figure.draw, so they are left out of savefig and are never rasterized.
+    """
+    def __init__(self, canvas, *artists):
+        self.canvas = canvas
+        self.artists = artists
+        self.background = None
+
+        for artist in self.artists:
+            artist.set_animated(True)
+
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.canvas.mpl_connect('resize_event', self.invalidate)
 
+    def invalidate(self, event=None):
+        self.background = None
 
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        for artist in self.artists:
+            self.canvas.figure.draw_artist(artist)
+
+    def update(self):
+        if self.background is None:
+            self.canvas.draw_idle()
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_artists()
+            self.canvas.blit(self.canvas.figure.bbox)
 
 
 class MainWindow(QMainWindow, Ui_MainWindow):
@@ -44,6 +89,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             (self.dsb_eps, 'eps'), (self.dsb_E, 'E')
         ]
 
+        self._paramsTimer = self.createDebounceTimer(self._doParametersChanged)
+        self._locationTimeTimer = self.createDebounceTimer(self._doLocationTimeChanged)
+        self._errorLimitTimer = self.createDebounceTimer(self._doErrorLimitChanged)
+
+        self._altazCache = (None, None, None)              # (sky, offsets, sizes) of the last plotted matcher sky
+
         self.settings = dotmap.DotMap(dict(
             resolution=dict(left=-1, bottom=-1, right=1, top=1)
         ))
@@ -55,9 +106,14 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.setupErrorPlot()
 
         self.sensorScatter = self.sensorAxis.scatter([0], [0], s=[50], c='white', marker='o')
-        self.skyScatter = self.skyAxis.scatter([0], [0], s=[50], c='red', marker='x')
+        self.skyScatter = self.skyAxis.scatter([0], [0], s=[50], c=[0], marker='x',
+                                               cmap='autumn_r', norm=mpl.colors.Normalize(vmin=0, vmax=np.radians(1)))
         self.starsScatter = self.skyAxis.scatter([0], [0], s=[1], marker='o', c='white')
-        self.errorScatter = self.errorAxis.scatter([0], [0], s=[1], marker='x', c='cyan')
+        self.errorScatter = self.errorAxis.scatter([0], [0], s=[1], c=[0], marker='x',
+                                                   cmap='autumn_r', norm=mpl.colors.Normalize(vmin=0, vmax=np.radians(0.5)))
+
+        self.skyBlitter = Blitter(self.skyCanvas, self.skyScatter, self.starsScatter)
+        self.errorBlitter = Blitter(self.errorCanvas, self.errorScatter)
 #        self.skyQuiver = self.skyAxis.quiver([0], [0], [0], [0])
 
         self.tab_sensor.layout().addWidget(self.sensorCanvas)
@@ -70,6 +126,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.matcher.load_catalogue('catalogue/HYG30.tsv')
         self.importConstants('out.yaml')
         self.matcher.catalogue.filter(7)
+        self.matcher.update_sky()
 
         self.onParametersChanged()
         self.plotSensorData()
@@ -77,8 +134,16 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         self.connectSignalSlots()
 
+    def createDebounceTimer(self, slot):
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(DEBOUNCE_INTERVAL)
+        timer.timeout.connect(slot)
+        return timer
+
     def populateStations(self):
-        for name, station in AMOS.stations.items():
+        self._stationList = list(AMOS.stations.values())
+        for station in self._stationList:
             self.cb_stations.addItem(station.name)
 
         self.cb_stations.currentIndexChanged.connect(self.selectStation)
@@ -87,16 +152,16 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if index == 0:
             station = Station("custom", self.dsb_lat.value(), self.dsb_lon.value(), 0)
         else:
-            station = list(AMOS.stations.values())[index - 1]
+            station = self._stationList[index - 1]
             self.dsb_lat.setValue(station.latitude)
             self.dsb_lon.setValue(station.longitude)
 
-        self.updateMatcher()
         self.onLocationTimeChanged()
 
     def setupSensorPlot(self):
         plt.style.use('dark_background')
         self.sensorFigure = Figure(figsize=(6, 6))
+        self.sensorFigure.set_dpi(100)
         self.sensorCanvas = FigureCanvasQTAgg(self.sensorFigure)
         self.sensorAxis = self.sensorFigure.add_subplot()
         self.sensorFigure.tight_layout()
@@ -108,6 +173,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def setupSkyPlot(self):
         self.skyFigure = Figure(figsize=(6, 6))
+        self.skyFigure.set_dpi(100)
         self.skyCanvas = FigureCanvasQTAgg(self.skyFigure)
         self.skyAxis = self.skyFigure.add_subplot(projection='polar')
         self.skyFigure.tight_layout()
@@ -122,6 +188,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def setupErrorPlot(self):
         self.errorFigure = Figure(figsize=(8, 6))
+        self.errorFigure.set_dpi(100)
         self.errorCanvas = FigureCanvasQTAgg(self.errorFigure)
         self.errorAxis = self.errorFigure.add_subplot()
         self.errorFigure.tight_layout()
@@ -187,23 +254,31 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.projection = BorovickaProjection(*self.get_constants_tuple())
 
     def onParametersChanged(self):
+        self._paramsTimer.start()
+
+    def _doParametersChanged(self):
         self.updateProjection()
 
-        errors = self.matcher.errors_dots(self.projection, True)
-        self.plotObservedStars(errors)
-        self.plotErrors(errors)
+        errors, (z, a) = self.matcher.errors_dots(self.projection, True, return_projection=True)
+        self.plotObservedStars(errors, z, a)
+        self.plotErrors(errors, z, a)
 
     def onLocationTimeChanged(self):
+        self._locationTimeTimer.start()
+
+    def _doLocationTimeChanged(self):
         self.updateMatcher()
         self.plotCatalogueStars()
 
-        errors = self.matcher.errors_dots(self.projection, True)
-        self.plotCatalogueStars()
-        self.plotErrors(errors)
+        errors, (z, a) = self.matcher.errors_dots(self.projection, True, return_projection=True)
+        self.plotErrors(errors, z, a)
 
     def onErrorLimitChanged(self):
-        errors = self.matcher.errors_dots(self.projection, True)
-        self.plotErrors(errors)
+        self._errorLimitTimer.start()
+
+    def _doErrorLimitChanged(self):
+        errors, (z, a) = self.matcher.errors_dots(self.projection, True, return_projection=True)
+        self.plotErrors(errors, z, a)
 
     def exportFile(self):
         filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export constants to file", ".", "YAML files (*.yaml)")
@@ -242,7 +317,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.plotSensorData()
 
     def loadYAML(self, file):
-        data = dotmap.DotMap(yaml.safe_load(open(file, 'r')))
+        with open(file, 'rb') as f:
+            data = dotmap.DotMap(yaml.load(f, Loader=SafeLoader))
         self.setLocation(data.Latitude, data.Longitude)
         self.updateLocation()
         self.setTime(datetime.datetime.strptime(data.EventStartTime, "%Y-%m-%d %H:%M:%S.%f").replace(tzinfo=zoneinfo.ZoneInfo('UTC')))
@@ -258,19 +334,26 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def importConstants(self, filename):
         try:
-            with open(filename, 'r') as file:
+            with open(filename, 'rb') as file:
                 try:
-                    data = dotmap.DotMap(yaml.safe_load(file))
+                    data = dotmap.DotMap(yaml.load(file, Loader=SafeLoader))
+                    blockers = self.blockParamSignals()
                     for widget, param in self.param_widgets:
-                        widget.blockSignals(True)
                         widget.setValue(data.params[param])
-                        widget.blockSignals(False)
+                    self.unblockParamSignals(blockers)
                     self.updateProjection()
                 except yaml.YAMLError as exc:
                     print(f"Could not open file {filename}")
         except FileNotFoundError as exc:
             print(f"Could not import constants: {exc}")
 
+    def blockParamSignals(self):
+        return [QSignalBlocker(widget) for widget, _ in self.param_widgets]
+
+    def unblockParamSignals(self, blockers):
+        for blocker in blockers:
+            blocker.unblock()
+
     def get_constants_tuple(self):
         return (self.dsb_x0.value(),
             self.dsb_y0.value(),
@@ -290,7 +373,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.w_input.setEnabled(False)
         self.w_input.repaint();
 
-        result = self.matcher.minimize(
+        result = self.matcher.minimize_lsq(
         #    location=self.location,
         #    time=self.time,
             x0=self.get_constants_tuple(),
@@ -298,6 +381,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         )
 
         x0, y0, a0, A, F, V, S, D, P, Q, e, E = tuple(result.x)
+        blockers = self.blockParamSignals()               # update all widgets first, then recompute just once
         self.dsb_x0.setValue(x0)
         self.dsb_y0.setValue(y0)
         self.dsb_a0.setValue(np.degrees(a0))
@@ -310,21 +394,23 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.dsb_Q.setValue(Q)
         self.dsb_eps.setValue(np.degrees(e))
         self.dsb_E.setValue(np.degrees(E))
+        self.unblockParamSignals(blockers)
 
         self.w_input.setEnabled(True)
         self.w_input.repaint();
         self.onParametersChanged()
 
     def cullSensor(self):
+        threshold = np.radians(self.dsb_error_limit.value())
         errors = self.matcher.errors_dots(self.projection, False)
-        self.matcher.sensor_data.use = (errors < np.radians(self.dsb_error_limit.value()))
+        self.matcher.sensor_data.use = (errors < threshold)
         self.matcher.update_sky()
         print(f"Culled the observed stars to {self.dsb_error_limit.value()}°: {self.matcher.sky.shape} stars are valid")
         self.onParametersChanged()
 
     def cullCatalogue(self):
         errors = self.matcher.errors_stars(self.projection, False)
-        self.matcher.catalogue.stars.use = (errors < np.radians(self.dsb_distance_limit.value()))
+        self.matcher.catalogue.cull(errors < np.radians(self.dsb_distance_limit.value()))
         print(f"Culled the catalogue to {self.dsb_distance_limit.value()}°: {self.matcher.catalogue.valid_stars.shape} stars used")
         self.matcher.update_sky()
         self.plotCatalogueStars()
@@ -335,29 +421,30 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.sensorAxis.set_xlim([self.matcher.sensor_data.rect.left, self.matcher.sensor_data.rect.right])
         self.sensorAxis.set_ylim([self.matcher.sensor_data.rect.top, self.matcher.sensor_data.rect.bottom])
         self.sensorScatter.set_offsets(self.matcher.sensor_data.points)
-        self.sensorScatter.set_sizes(np.sqrt(self.matcher.sensor_data.intensities))
-        self.sensorCanvas.draw()
+        self.sensorScatter.set_sizes(self.matcher.sensor_data.intensities_sqrt)
+        self.sensorScatter.set_rasterized(self.matcher.sensor_data.count > RASTERIZE_THRESHOLD)
+        self.sensorCanvas.draw_idle()
 
-    def plotObservedStars(self, errors):
+    def plotObservedStars(self, errors, z, a):
         #print(f"Plotting projected stars for {self.projection}")
-        z, a = self.matcher.sensor_data.project(self.projection, True)
         self.skyScatter.set_offsets(np.stack((a, np.degrees(z)), axis=1))
 
-        cmap = mpl.cm.get_cmap('autumn_r')
-        norm = mpl.colors.Normalize(vmin=0, vmax=np.radians(1))
-        self.skyScatter.set_facecolors(cmap(norm(errors)))
-        self.skyScatter.set_sizes(10 + 0.05 * self.matcher.sensor_data.m)
-        self.skyCanvas.draw()
+        self.skyScatter.set_array(errors)
+        self.skyScatter.set_sizes(self.matcher.sensor_data.sky_sizes)
+        self.skyBlitter.update()
 
     def plotCatalogueStars(self):
         print(f"Plotting catalogue stars for {self.location} at {self.time}")
-        z, a = self.matcher.catalogue.to_altaz(self.location, self.time, True)
-        offsets = np.stack((np.radians(a), 90 - z), axis=1)
-        sizes = 0.2 * np.exp(-0.666 * (self.matcher.catalogue.vmag - 5))
+        sky, offsets, sizes = self._altazCache
+        if sky is not self.matcher.sky:                         # the matcher already holds alt/az of the same stars
+            alt, az = self.matcher.sky
+            offsets = np.stack((np.radians(az), 90 - alt), axis=1).astype(np.float32, copy=False)
+            sizes = self.matcher.sky_sizes
+            self._altazCache = (self.matcher.sky, offsets, sizes)
 
         self.starsScatter.set_offsets(offsets)
         self.starsScatter.set_sizes(sizes)
-        self.skyCanvas.draw()
+        self.skyBlitter.update()
 
     def plotQuiver(self):
         return
@@ -372,35 +459,43 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         self.skyCanvas.draw()
 
-    def plotErrors(self, errors):
-        pos = self.matcher.sensor_data.project(self.projection, True)
-        alt = np.degrees(pos[0, :])
-        az = np.degrees(pos[1, :])
+    def plotErrors(self, errors, z, a):
+        alt = np.degrees(z)
+        az = np.degrees(a)
 
         avg_error = self.matcher.avg_error(errors)
         max_error = self.matcher.max_error(errors)
         self.lb_avg_error.setText(f'{np.degrees(avg_error):.6f}°')
         self.lb_max_error.setText(f'{np.degrees(max_error):.6f}°')
         self.lb_total_stars.setText(f'{alt.size}')
-        outside_limit = errors[errors > np.radians(self.dsb_error_limit.value())].size
+        threshold = np.radians(self.dsb_error_limit.value())
+        outside_limit = int(np.count_nonzero(errors > threshold))
         self.lb_outside_limit.setText(f'{outside_limit}')
 
-        if max_error is not np.nan:
-            self.errorAxis.set_ylim([0, np.degrees(max_error) * 1.05])
+        relayout = False
+        if not np.isnan(max_error):
+            top = np.degrees(max_error) * 1.05
+            current = self.errorAxis.get_ylim()[1]
+            if top > current or top < current / 2:         # hysteresis: only rescale when errors outgrow or shrink well below the axis
+                self.errorAxis.set_ylim((0, top))
+                relayout = True
             self.errorScatter.set_offsets(np.stack((alt, np.degrees(errors)), axis=1))
 
-            cmap = mpl.cm.get_cmap('autumn_r')
-            norm = mpl.colors.Normalize(vmin=0, vmax=np.radians(0.5))
-            self.errorScatter.set_facecolors(cmap(norm(errors)))
-            self.errorScatter.set_sizes(0.05 * self.matcher.sensor_data.m)
-        self.errorCanvas.draw()
+            self.errorScatter.set_array(errors)
+            self.errorScatter.set_sizes(self.matcher.sensor_data.error_sizes)
+
+        if relayout:
+            self.errorCanvas.draw_idle()                    # limits changed, axes and ticks must be redrawn too
+        else:
+            self.errorBlitter.update()
 
     def pair(self):
         print(f"Trying to pair stars")
-        self.fitter = Fitter(self.matcher.pair(self.projection), self.matcher.catalogue.valid_stars)
+        self.fitter = Fitter(self.matcher.pair(self.projection), self.matcher.sky_stars)
 
+        errors, (z, a) = self.matcher.errors_dots(self.projection, True, return_projection=True)
         self.plotCatalogueStars()
-        self.plotErrors()
+        self.plotErrors(errors, z, a)
         self.plotQuiver()
 
 
@@ -1,16 +1,51 @@
 import numpy as np
 import pandas as pd
+import scipy as sp
 
+from numba import njit, prange
 from astropy import units as u
 from astropy.coordinates import EarthLocation, SkyCoord, AltAz
 from typing import Optional
 
 from .base import Comparator
 from projections import BorovickaProjection
+from projections.borovicka import borovicka_point
 from models import SensorData, Catalogue
 from utilities import spherical_distance
 
 
+@njit(fastmath=True)
+def _distance(alt, az, cos_alt, cat_alt, cat_az, cos_cat_alt):
+    """ Same formula as utilities.spherical_distance, for a single pair of points """
+    dalt = np.sin(0.5 * (cat_alt - alt))
+    daz = np.sin(0.5 * (cat_az - az))
+    return 2 * np.sin(np.sqrt(dalt * dalt + cos_alt * cos_cat_alt * daz * daz))
+
+
+@njit(parallel=True, fastmath=True)                     # not cached: numba would not notice changes to borovicka_point
+def _residuals_kernel(xs, ys, cat_alt, cat_az, a0, x0, y0, A, cos_tilt, sin_tilt, V, S, D, P, Q, tiny_eps, cos_eps, sin_eps, E):
+    """
+    Project every dot with the Borovička projection and return its distance to the nearest catalogue star,
+    equivalent to errors_dots for a BorovickaProjection but in a single parallel pass without the N x M matrix.
+    cat_alt and cat_az are in radians and must not be empty.
+    """
+    cos_cat_alt = np.cos(cat_alt)
+    residuals = np.empty(xs.size)
+
+    for i in prange(xs.size):
+        z, a = borovicka_point(xs[i], ys[i], a0, x0, y0, A, cos_tilt, sin_tilt, V, S, D, P, Q, tiny_eps, cos_eps, sin_eps, E)
+        alt = np.pi / 2 - z
+        cos_alt = np.cos(alt)
+        nearest = _distance(alt, a, cos_alt, cat_alt[0], cat_az[0], cos_cat_alt[0])    # no inf sentinel under fastmath
+        for j in range(1, cat_alt.size):
+            dist = _distance(alt, a, cos_alt, cat_alt[j], cat_az[j], cos_cat_alt[j])
+            if dist < nearest:
+                nearest = dist
+        residuals[i] = nearest
+
+    return residuals
+
+
 class StarMatcher(Comparator):
     """
     Initial star matcher: loads a catalogue (dec/ra) and a set of points (x/y)
@@ -21,6 +56,9 @@ class StarMatcher(Comparator):
         self.projection_cls = projection_cls
         self.catalogue = None
         self.sky = None
+        self.sky_rad = None
+        self.sky_mask = None
+        self.altaz_frame = None
         self.sensor_data = SensorData()
         self.update(location, time)
 
@@ -34,14 +72,30 @@ class StarMatcher(Comparator):
     def update(self, location, time):
         self.location = location
         self.time = time
+        self.altaz_frame = Catalogue.altaz_frame(location, time)
 
         if self.catalogue is not None:
             self.update_sky()
 
     def update_sky(self):
-        self.sky = self.catalogue.to_altaz(self.location, self.time, masked=True)
+        """ Transform the valid stars to alt/az, skipping those whose HEALPix cells are entirely below the horizon """
+        self.sky_mask = self.catalogue.visible(self.location, self.time)
+        self.set_sky(self.catalogue.to_altaz(self.altaz_frame, masked=True, subset=self.sky_mask))
         print(f"Updating sky: {self.sky.shape} valid stars")
 
+    def set_sky(self, sky):
+        """ Set the alt/az of valid catalogue stars in degrees, shape (2, M), along with the copy in radians """
+        self.sky = sky
+        self.sky_rad = np.ascontiguousarray(np.radians(sky))
+
+    @property
+    def sky_stars(self):
+        return self.catalogue.valid_stars[self.sky_mask]
+
+    @property
+    def sky_sizes(self):
+        return self.catalogue.sizes[self.sky_mask]
+
     def avg_error(self, errors) -> float:
         if errors.size == 0:
             return np.nan
@@ -54,11 +108,17 @@ class StarMatcher(Comparator):
         else:
             return np.max(errors)
 
-    def errors_dots(self, projection, masked) -> np.ndarray:
-        return self.find_nearest_value(self.sensor_data.project(projection, masked=masked), self.sky, axis=0)
+    def errors_dots(self, projection, masked, *, return_projection=False):
+        """
+        Angular distance from every dot to the nearest catalogue star.
+        With return_projection=True also returns the projected (z, a) of the dots, so callers need not project again.
+        """
+        projected = self.sensor_data.project(projection, masked=masked)
+        errors = self.find_nearest_value(projected, self.sky, axis=0)
+        return (errors, projected) if return_projection else errors
 
     def errors_stars(self, projection, masked) -> np.ndarray:
-        return self.find_nearest_value(self.sensor_data.project(projection, masked=masked), self.catalogue.to_altaz(self.location, self.time, masked=masked), axis=1)
+        return self.find_nearest_value(self.sensor_data.project(projection, masked=masked), self.catalogue.to_altaz(self.altaz_frame, masked=masked), axis=1)
 
     def vector_errors(self, projection, *, for_stars=False) -> np.ndarray:
         pass
@@ -74,10 +134,10 @@ class StarMatcher(Comparator):
         np.ndarray(N, M)
         """
         #observed = observed[observed[:, 0] < np.pi / 2]     # Cull stars that are below the horizon
-        observed = np.expand_dims(observed, 1)
+        z, a = observed
+        observed = np.expand_dims(np.stack((np.pi / 2 - z, a)), 1)  # Convert observed zenith distance to altitude
         catalogue = np.expand_dims(catalogue, 2)
         catalogue = np.radians(catalogue)
-        observed[0, :, :] = np.pi / 2 - observed[0, :, :]   # Convert observed altitude to zenith distance
         return spherical_distance(observed, catalogue)
 
     def compute_vector_errors(self, observed, catalogue):
@@ -108,3 +168,26 @@ class StarMatcher(Comparator):
     def func(self, x):
         return self.avg_error(self.errors_dots(self.projection_cls(*x), True))
 
+    def residuals(self, x):
+        projection = self.projection_cls(*x)
+        if isinstance(projection, BorovickaProjection):
+            if self.sky_rad.shape[1] == 0:
+                raise ValueError("Cannot compute residuals against an empty sky")
+            return _residuals_kernel(self.sensor_data.xv, self.sensor_data.yv, self.sky_rad[0], self.sky_rad[1], *projection.kernel_args)
+        else:
+            return self.errors_dots(projection, True)
+
+    def minimize_lsq(self, x0=(0, 0, 0, 0, 0, np.pi / 2, 0, 0, 0, 0, 0, 0), maxiter=30):
+        """ Least-squares fit of the residual vector, exploits the sum-of-squares structure that minimize ignores """
+        lower = np.full(12, -np.inf)
+        upper = np.full(12, np.inf)
+        lower[5] = 0    # V
+        lower[10] = 0   # epsilon
+
+        result = sp.optimize.least_squares(self.residuals, np.clip(x0, lower, upper), method='trf',
+            bounds=(lower, upper),
+            x_scale='jac',
+            max_nfev=maxiter,
+            verbose=1,
+        )
+        return result
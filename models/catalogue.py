@@ -1,8 +1,14 @@
 import numpy as np
 import pandas as pd
+import healpy as hp
 
 from astropy import units as u
 from astropy.coordinates import EarthLocation, SkyCoord, AltAz
+from astropy.time import Time
+
+
+HEALPIX_NSIDE = 16                          # 3072 cells of about 3.7° each
+VISIBLE_RADIUS = np.radians(95)             # stars further than this from the zenith are certainly below the horizon
 
 
 class Catalogue():
@@ -10,6 +16,10 @@ class Catalogue():
         self.stars = None
         self.skycoords = None
         self.name = None
+        self.pixels = None
+        self._valid_skycoord = None
+        self._valid_pixels = None
+        self._sizes = None
 
         if filename is not None:
             self.load(filename)
@@ -18,20 +28,63 @@ class Catalogue():
         self.name = filename
         self.stars = pd.read_csv(filename, sep='\t', header=1)
         self.skycoord = SkyCoord(self.stars.ra * u.deg, self.stars.dec * u.deg)
+        self.pixels = hp.ang2pix(HEALPIX_NSIDE, np.radians(90 - self.stars.dec.to_numpy()), np.radians(self.stars.ra.to_numpy()))
         self.stars['use'] = True
+        self._update_valid()
 
     def filter(self, vmag):
-        self.stars[self.stars.vmag <= vmag]['use'] = False
+        """ Permanently drop all stars fainter than vmag, so that no later pass has to touch them """
+        keep = (self.stars.vmag <= vmag).to_numpy()
+        self.stars = self.stars[keep].reset_index(drop=True)
+        self.skycoord = self.skycoord[keep]
+        self.pixels = self.pixels[keep]
+        self._update_valid()
         return self
 
+    def cull(self, use):
+        self.stars['use'] = use
+        self._update_valid()
+        return self
+
+    def _update_valid(self):
+        """ Pack the valid stars and their marker sizes, recomputed only when the set of valid stars changes """
+        use = self.stars['use'].to_numpy()
+        self._valid_skycoord = self.skycoord[use]
+        self._valid_pixels = self.pixels[use]
+        self._sizes = (0.2 * np.exp(-0.666 * (self.valid_stars.vmag.to_numpy() - 5))).astype(np.float32)
+
+    @property
+    def sizes(self):
+        return self._sizes
+
     @property
     def valid_stars(self):
         return self.stars[self.stars['use']]
 
-    def to_altaz(self, location, time, masked):
-        altaz = AltAz(location=location, obstime=time, pressure=0, obswl=500 * u.nm)
-        source = self.skycoord[self.stars['use']] if masked else self.skycoord
-        stars = source.transform_to(altaz)
+    @staticmethod
+    def altaz_frame(location, time):
+        return AltAz(location=location, obstime=Time(time), pressure=0, obswl=500 * u.nm)
+
+    def visible(self, location, time):
+        """
+        Mask of valid stars that lie in HEALPix cells intersecting the cap of VISIBLE_RADIUS around the zenith.
+        Cheap enough to call before to_altaz, so that stars well below the horizon are never transformed.
+        """
+        lst = Time(time).sidereal_time('mean', longitude=location.lon).radian
+        zenith = hp.ang2vec(np.pi / 2 - location.lat.radian, lst)
+        cells = np.zeros(hp.nside2npix(HEALPIX_NSIDE), dtype=bool)
+        cells[hp.query_disc(HEALPIX_NSIDE, zenith, VISIBLE_RADIUS, inclusive=True)] = True
+        return cells[self._valid_pixels]
+
+    def to_altaz(self, frame, masked, *, subset=None):
+        """
+        Transform (valid) stars to alt/az in frame, as built once per location and time by altaz_frame.
+        subset is an optional mask over the selected stars, such as the one returned by visible().
+        """
+        source = self._valid_skycoord if masked else self.skycoord
+        if subset is not None:
+            source = source[subset]
+        stars = source.transform_to(frame)
         return np.stack((stars.alt.degree, stars.az.degree))
 
     @property
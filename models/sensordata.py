@@ -2,6 +2,8 @@ import dotmap
 import numpy as np
 import pandas as pd
 
+from typing import Tuple
+
 from astropy import units as u
 from astropy.coordinates import EarthLocation, SkyCoord, AltAz
 
@@ -15,6 +17,10 @@ class SensorData():
         self.rect = dotmap.DotMap(left=-1, right=1, bottom=-1, top=1)
         self.points = np.empty(shape=(0, 2))
         self.intensities = np.empty(shape=(0,))
+        self.intensities_sqrt = np.empty(shape=(0,), dtype=np.float32)
+        self._sky_sizes = np.empty(shape=(0,), dtype=np.float32)
+        self._error_sizes = np.empty(shape=(0,), dtype=np.float32)
+        self.use = np.empty(shape=(0,), dtype=bool)
         self.count = 0
 
     def load(self, data):
@@ -22,6 +28,9 @@ class SensorData():
         self.rect = dotmap.DotMap(dict(left=0, top=0, right=w, bottom=h))
         self.points = np.asarray([[star.x, star.y] for star in data.Refstars])
         self.intensities = np.asarray([star.intensity for star in data.Refstars])
+        self.intensities_sqrt = np.sqrt(self.intensities).astype(np.float32)       # marker sizes for plotting
+        self._sky_sizes = (10 + 0.05 * self.intensities).astype(np.float32)
+        self._error_sizes = (0.05 * self.intensities).astype(np.float32)
         self.use = np.ones_like(self.points[:, 0], dtype=bool)
         self.count = len(self.points)
 
@@ -41,6 +50,14 @@ class SensorData():
     def valid(self):
         return self.points[self.use]
 
+    @property
+    def sky_sizes(self):
+        return self._sky_sizes[self.use]
+
+    @property
+    def error_sizes(self):
+        return self._error_sizes[self.use]
+
     @property
     def xv(self):
         return self.points[self.use][:, 0]
@@ -49,9 +66,9 @@ class SensorData():
     def yv(self):
         return self.points[self.use][:, 1]
 
-    def project(self, projection, masked):
+    def project(self, projection, masked) -> Tuple[np.ndarray, np.ndarray]:
         if masked:
-            return np.stack(projection(self.xv, self.yv), axis=0)
+            return projection(self.xv, self.yv)
         else:
-            return np.stack(projection(self.x, self.y), axis=0)
+            return projection(self.x, self.y)
 
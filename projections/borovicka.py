@@ -1,4 +1,5 @@
 import numpy as np
+from numba import njit
 from typing import Tuple
 
 from .base import Projection
@@ -6,6 +7,67 @@ from .shifters import OpticalAxisShifter, TiltShifter
 from .transformers import LinearTransformer, ExponentialTransformer, BiexponentialTransformer
 
 
+_TWO_PI = 2 * np.pi
+
+
+@njit(fastmath=True, cache=True)
+def _wrap(a):
+    """ Wrap an angle to [0, 2pi), like np.mod but for a scalar inside the kernels """
+    return a - _TWO_PI * np.floor(a / _TWO_PI)
+
+
+@njit(fastmath=True, cache=True)
+def _shift_and_stretch(x, y, a0, x0, y0, A, cos_tilt, sin_tilt, V, S, D, P, Q, E):
+    """ TiltShifter followed by BiexponentialTransformer for a single point, returns (u, b) """
+    xs = x - x0
+    ys = y - y0
+    r = np.sqrt(xs * xs + ys * ys) + A * ys * cos_tilt - A * xs * sin_tilt
+    b = a0 - E + np.arctan2(ys, xs)
+    u = V * r + S * (np.exp(D * r) - 1) + P * (np.exp(Q * r * r) - 1)
+    return u, b
+
+
+@njit(fastmath=True, cache=True)
+def _displace(u, b, cos_eps, sin_eps, E):
+    """ Spherical triangle from (u, b) around the centre of FoV to (z, a), for non-negligible epsilon """
+    cos_u = np.cos(u)
+    sin_u = np.sin(u)
+    cosz = cos_u * cos_eps - sin_u * sin_eps * np.cos(b)
+    sna = np.sin(b) * sin_u
+    cna = (cos_u - cos_eps * cosz) / sin_eps
+    return np.arccos(cosz), _wrap(E + np.arctan2(sna, cna))
+
+
+@njit(fastmath=True, cache=True)
+def borovicka_point(x, y, a0, x0, y0, A, cos_tilt, sin_tilt, V, S, D, P, Q, tiny_eps, cos_eps, sin_eps, E):
+    """
+    Borovička projection of a single point (x, y) to (z, a), inlining TiltShifter and BiexponentialTransformer.
+    Trigonometric functions of the constant angles are precomputed by the caller, see BorovickaProjection.kernel_args.
+    """
+    u, b = _shift_and_stretch(x, y, a0, x0, y0, A, cos_tilt, sin_tilt, V, S, D, P, Q, E)
+    if tiny_eps:                                            # for tiny epsilon there is no displacement
+        return u, _wrap(E + b)
+    else:
+        return _displace(u, b, cos_eps, sin_eps, E)
+
+
+@njit(fastmath=True, cache=True)
+def _borovicka_kernel(x, y, a0, x0, y0, A, cos_tilt, sin_tilt, V, S, D, P, Q, tiny_eps, cos_eps, sin_eps, E, z, a):
+    """
+    Fused single-pass evaluation of the Borovička projection, writes into preallocated z and a.
+    Branches on epsilon once, outside the loop.
+    """
+    if tiny_eps:                                            # for tiny epsilon there is no displacement
+        for i in range(x.size):
+            u, b = _shift_and_stretch(x[i], y[i], a0, x0, y0, A, cos_tilt, sin_tilt, V, S, D, P, Q, E)
+            z[i] = u
+            a[i] = _wrap(E + b)
+    else:
+        for i in range(x.size):
+            u, b = _shift_and_stretch(x[i], y[i], a0, x0, y0, A, cos_tilt, sin_tilt, V, S, D, P, Q, E)
+            z[i], a[i] = _displace(u, b, cos_eps, sin_eps, E)
+
+
 class BorovickaProjection(Projection):
     def __init__(self, x0: float=0, y0: float=0, a0: float=0, A: float=0, F: float=0,
             V: float=1, S: float=0, D: float=0, P: float=0, Q: float=0, epsilon: float=0, E: float=0):
@@ -22,25 +84,31 @@ class BorovickaProjection(Projection):
         self.Q = Q
         self.epsilon = epsilon                              # zenith angle of centre of FoV
         self.E = E                                          # azimuth angle of centre of FoV
+        self._cos_tilt = np.cos(F - a0)
+        self._sin_tilt = np.sin(F - a0)
+        self._cos_eps = np.cos(epsilon)
+        self._sin_eps = np.sin(epsilon)
+        self._tiny_eps = bool(abs(epsilon) < 1e-14)
         self.axis_shifter = TiltShifter(x0=x0, y0=y0, a0=a0, A=A, F=F, E=E)
         self.radial_transform = BiexponentialTransformer(V, S, D, P, Q)
 
     def __call__(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
-        r, b = self.axis_shifter(x, y)
-        u = self.radial_transform(r)
-
-        if abs(self.epsilon) < 1e-14:                       # for tiny epsilon there is no displacement
-            z = u                                           # and we are able to calculate the coordinates immediately
-            a = self.E + b
-        else:
-            cosz = np.cos(u) * np.cos(self.epsilon) - np.sin(u) * np.sin(self.epsilon) * np.cos(b)
-            z = np.arccos(cosz)
-            sna = np.sin(b) * np.sin(u)
-            cna = (np.cos(u) - np.cos(self.epsilon) * cosz) / np.sin(self.epsilon)
-            a = self.E + np.arctan2(sna, cna)
-
-        a = np.fmod(a + 2 * np.pi, 2 * np.pi)                           # wrap around to [0, 2pi)
-        return z, a
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+        xf = np.ascontiguousarray(x).ravel()
+        yf = np.ascontiguousarray(y).ravel()
+        z = np.empty_like(xf)
+        a = np.empty_like(xf)
+
+        _borovicka_kernel(xf, yf, *self.kernel_args, z, a)
+        return z.reshape(x.shape)[()], a.reshape(x.shape)[()]
+
+    @property
+    def kernel_args(self) -> tuple:
+        """ Constants in the order expected by borovicka_point, as plain floats so that numba compiles just once """
+        return (float(self.a0), float(self.x0), float(self.y0), float(self.A),
+                float(self._cos_tilt), float(self._sin_tilt),
+                float(self.V), float(self.S), float(self.D), float(self.P), float(self.Q),
+                self._tiny_eps, float(self._cos_eps), float(self._sin_eps), float(self.E))
 
     def invert(self, z: np.ndarray, a: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         a -= self.E
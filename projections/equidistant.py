@@ -11,9 +11,7 @@ class EquidistantProjection(Projection):
         pass
 
     def __call__(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
-        z = np.sqrt(np.square(x) + np.square(y))
-        a = np.arctan2(y, x)
-        return z, a
+        return np.hypot(x, y), np.arctan2(y, x)
 
     def invert(self, z: np.ndarray, a: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         return z * np.sin(a), z * np.cos(a)
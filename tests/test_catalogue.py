@@ -1,4 +1,9 @@
 import pytest
+import numpy as np
+
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+
 from models.sensordata import SensorData
 from models.catalogue import Catalogue
 
@@ -18,6 +23,52 @@ class TestCatalogue():
         assert hyg30.skycoords.shape == (5068,)
 
 
+class TestFilter():
+    def test_drops_faint(self, hyg30):
+        hyg30.filter(4)
+        assert (hyg30.vmag <= 4).all()
+
+    def test_lengths(self, hyg30):
+        hyg30.filter(4)
+        count = hyg30.count
+        assert 0 < count < 5068
+        assert hyg30.skycoord.shape == (count,)
+        assert hyg30.pixels.shape == (count,)
+        assert hyg30.sizes.shape == (count,)
+
+
+class TestCull():
+    def test_valid_stars(self, hyg30):
+        use = np.arange(hyg30.count) % 3 == 0
+        hyg30.cull(use)
+        assert len(hyg30.valid_stars) == np.count_nonzero(use)
+        assert (hyg30.valid_stars.index == np.flatnonzero(use)).all()
+
+    def test_sizes(self, hyg30):
+        hyg30.cull(np.arange(hyg30.count) % 3 == 0)
+        expected = 0.2 * np.exp(-0.666 * (hyg30.valid_stars.vmag.to_numpy() - 5))
+        assert hyg30.sizes == pytest.approx(expected, rel=1e-6)
+
+    def test_reversible(self, hyg30):
+        hyg30.cull(np.zeros(hyg30.count, dtype=bool))
+        hyg30.cull(np.ones(hyg30.count, dtype=bool))
+        assert len(hyg30.valid_stars) == hyg30.count
+
+
+class TestVisible():
+    def test_covers_all_stars_above_horizon(self, hyg30):
+        location = EarthLocation(17.27 * u.deg, 48.37 * u.deg)
+        time = '2022-05-31 05:56:55'
+        visible = hyg30.visible(location, time)
+        alt, _ = hyg30.to_altaz(Catalogue.altaz_frame(location, time), True)
+        assert visible.shape == (hyg30.count,)
+        assert visible[alt > 0].all()
+
+    def test_skips_stars_below_horizon(self, hyg30):
+        visible = hyg30.visible(EarthLocation(17.27 * u.deg, 48.37 * u.deg), '2022-05-31 05:56:55')
+        assert 0 < np.count_nonzero(visible) < hyg30.count
+
+
 class TestSensorData():
     def test_dimensions(self):
         pass
@@ -1,7 +1,7 @@
 import pytest
 import numpy as np
 
-from projections import Projection, BorovickaProjection
+from projections import Projection, EquidistantProjection, BorovickaProjection
 
 
 class TestBase():
@@ -40,3 +40,20 @@ class TestBorovickaProjection():
 
 #    def test_identity_invert(self, boro_identity):
 #        assert boro_identity.invert(*boro_identity(0.27, -0.34)) == pytest.approx((0.27, -0.34), rel=1e-14)
+
+    def test_identity_array(self, boro_identity):
+        z, a = boro_identity(np.array([1, 0, -1]), np.array([0, -1, 0]))
+        assert z == pytest.approx(np.full(3, np.pi / 2), rel=1e-14)
+        assert a == pytest.approx(np.array([0, 3 * np.pi / 2, np.pi]), rel=1e-14)
+
+    def test_wrap_large_rotation(self):
+        boro = BorovickaProjection(0, 0, np.radians(-400), 0, 0, np.pi / 2, 0, 0, 0, 0, 0, 0)
+        assert boro(1, 0) == pytest.approx((np.pi / 2, np.radians(320)), rel=1e-12)
+
+
+class TestEquidistantProjection():
+    def test_north(self):
+        assert EquidistantProjection()(1, 0) == pytest.approx((1, 0), rel=1e-14)
+
+    def test_somewhere(self):
+        assert EquidistantProjection()(0.3, 0.4) == pytest.approx((0.5, np.arctan2(0.4, 0.3)), rel=1e-14)
@@ -0,0 +1,48 @@
+import pytest
+import numpy as np
+
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+
+from projections import BorovickaProjection
+from matchers import StarMatcher
+
+
+@pytest.fixture
+def params():
+    return (0.01, -0.02, 0.1, 0.02, 0.3, np.pi / 2, 0.001, 0.1, 0.0001, 0.01, 0.05, 0.3)
+
+
+@pytest.fixture
+def matcher(params):
+    rng = np.random.default_rng(42)
+    matcher = StarMatcher(EarthLocation(17.27 * u.deg, 48.37 * u.deg), '2022-05-31 05:56:55')
+
+    points = rng.uniform(-0.8, 0.8, size=(20, 2))
+    matcher.sensor_data.points = points
+    matcher.sensor_data.use = np.ones(20, dtype=bool)
+    matcher.sensor_data.count = 20
+
+    z, a = BorovickaProjection(*params)(points[:, 0], points[:, 1])
+    alt = 90 - np.degrees(z) + rng.normal(0, 0.1, size=20)
+    az = np.degrees(a) + rng.normal(0, 0.1, size=20)
+    extra_alt = rng.uniform(0, 90, size=30)
+    extra_az = rng.uniform(0, 360, size=30)
+    matcher.set_sky(np.stack((np.concatenate((alt, extra_alt)), np.concatenate((az, extra_az)))))
+    return matcher
+
+
+class TestResiduals():
+    def test_matches_errors_dots(self, matcher, params):
+        expected = matcher.errors_dots(BorovickaProjection(*params), True)
+        assert matcher.residuals(params) == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+    def test_matches_errors_dots_zenith(self, matcher, params):
+        params = params[:10] + (0, params[11])
+        expected = matcher.errors_dots(BorovickaProjection(*params), True)
+        assert matcher.residuals(params) == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+    def test_empty_sky(self, matcher, params):
+        matcher.set_sky(np.empty(shape=(2, 0)))
+        with pytest.raises(ValueError):
+            matcher.residuals(params)